@@ -3,8 +3,12 @@
 ちいかわマーケットから収集した商品情報を表示
 """
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from supabase import create_client
+import html
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 # ページ設定
@@ -15,6 +19,16 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# 画面表示に使用するカラムのみ取得
+INFORMATION_COLUMNS = "title,url,images,price,status,event_date,published_at"
+RESTOCK_COLUMNS = "product_title,product_url,previous_event_date,new_event_date"
+
+# 1ページあたりの表示件数
+PAGE_SIZE = 24
+
+# カード表示用サムネイルの幅（px）
+THUMBNAIL_WIDTH = 400
+
 # カスタムCSS
 st.markdown("""
 <style>
@@ -42,6 +56,45 @@ st.markdown("""
         border-color: #FF9800;
         color: #FF9800;
     }
+    .card-grid {
+        display: grid;
+        grid-template-columns: repeat(3, minmax(0, 1fr));
+        gap: 1rem;
+        margin-bottom: 1rem;
+    }
+    .card {
+        display: flex;
+        flex-direction: column;
+        gap: 0.5rem;
+        padding: 1rem;
+        border: 1px solid rgba(128, 128, 128, 0.3);
+        border-radius: 0.5rem;
+    }
+    .card img {
+        width: 100%;
+        border-radius: 0.25rem;
+    }
+    .card-title {
+        font-weight: bold;
+    }
+    .card-caption {
+        font-size: 0.875rem;
+        opacity: 0.6;
+    }
+    .card-link {
+        margin-top: auto;
+        padding: 0.4rem;
+        border: 1px solid rgba(128, 128, 128, 0.3);
+        border-radius: 0.5rem;
+        text-align: center;
+        text-decoration: none;
+        color: inherit !important;
+    }
+    @media (max-width: 768px) {
+        .card-grid {
+            grid-template-columns: 1fr;
+        }
+    }
 </style>
 """, unsafe_allow_html=True)
 
@@ -67,8 +120,25 @@ except Exception as e:
 st.markdown('<h1 class="main-title">🐭 ちいかわ情報まとめ</h1>', unsafe_allow_html=True)
 st.caption("ちいかわマーケットから自動収集")
 
-# 再入荷情報を表示
-@st.cache_data(ttl=300)
+
+def run_with_script_ctx(ctx, func, *args, **kwargs):
+    """
+    ワーカースレッドにStreamlitの実行コンテキストを引き継いで関数を実行
+
+    ワーカー側ではUI要素を描画しないこと（スピナーやエラー表示はメインスレッドで行う）
+
+    Args:
+        ctx: メインスレッドのScriptRunContext
+        func: 実行する関数
+
+    Returns:
+        関数の戻り値
+    """
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return func(*args, **kwargs)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
 def fetch_recent_restocks(days=7):
     """
     最近の再入荷情報を取得
@@ -79,28 +149,11 @@ def fetch_recent_restocks(days=7):
     Returns:
         再入荷情報のリスト
     """
-    try:
-        date_from = (datetime.now() - timedelta(days=days)).isoformat()
-        result = supabase.table("restock_history").select("*").gte("detected_at", date_from).order("detected_at", desc=True).limit(10).execute()
-        return result.data
-    except Exception as e:
-        st.error(f"再入荷情報取得エラー: {e}")
-        return []
-
-recent_restocks = fetch_recent_restocks(7)
+    # 例外はワーカースレッドから呼び出し元に伝播させ、エラー表示はメインスレッドで行う
+    date_from = (datetime.now() - timedelta(days=days)).isoformat()
+    result = supabase.table("restock_history").select(RESTOCK_COLUMNS).gte("detected_at", date_from).order("detected_at", desc=True).limit(10).execute()
+    return result.data
 
-if recent_restocks:
-    st.info(f"🔔 **最近7日間の再入荷: {len(recent_restocks)}件**")
-    with st.expander("📦 再入荷商品を見る", expanded=False):
-        for restock in recent_restocks:
-            col1, col2 = st.columns([3, 1])
-            with col1:
-                st.markdown(f"**{restock['product_title']}**")
-                date_info = f"{restock.get('previous_event_date', '不明')} → **{restock['new_event_date']}**"
-                st.caption(f"📅 {date_info}")
-            with col2:
-                st.link_button("詳細", restock['product_url'], use_container_width=True)
-        st.divider()
 
 # サイドバー：フィルター
 with st.sidebar:
@@ -157,11 +210,128 @@ with st.sidebar:
     # リフレッシュボタン
     if st.button("🔄 更新", use_container_width=True):
         st.cache_data.clear()
+        st.session_state.page = 0
         st.rerun()
 
 
-@st.cache_data(ttl=300)
-def fetch_data(category, period, search, only_images, market_status, specific_date):
+def thumbnail_url(url, width=THUMBNAIL_WIDTH):
+    """
+    ShopifyのCDN画像をリサイズ済みURLに変換
+
+    Args:
+        url: 画像URL
+        width: 表示幅（px）
+
+    Returns:
+        リサイズ指定付きのURL（Shopify CDN以外はそのまま）
+    """
+    if '/cdn/shop/' in url or 'cdn.shopify.com' in url:
+        separator = '&' if '?' in url else '?'
+        return f"{url}{separator}width={width}"
+    return url
+
+
+def format_event_date(event_date):
+    """
+    発売日・再入荷日を表示用に整形
+
+    Args:
+        event_date: 日付文字列（YYYY-MM-DD形式）
+
+    Returns:
+        表示用の日付文字列（解析できない場合は空文字）
+    """
+    try:
+        return datetime.strptime(event_date, '%Y-%m-%d').strftime('%m月%d日')
+    except (ValueError, TypeError):
+        return ""
+
+
+def build_card_html(item):
+    """
+    商品カードのHTMLを生成
+
+    Args:
+        item: normalize_itemで整形済みのアイテム
+
+    Returns:
+        カードのHTML文字列
+    """
+    title = html.escape(item['title'])
+    parts = ['<div class="card">']
+
+    # 画像表示
+    if item['thumbnail']:
+        parts.append(f'<img src="{html.escape(item["thumbnail"])}" alt="{title}" loading="lazy" decoding="async">')
+
+    # タイトルとステータスバッジ
+    title_html = f'<div class="card-title">{title}'
+    if item.get('status'):
+        status_text = "新商品" if item['status'] == 'new' else "再入荷"
+        status_class = "status-new" if item['status'] == 'new' else "status-restock"
+        title_html += f' <span class="status-badge {status_class}">{status_text}</span>'
+    parts.append(title_html + '</div>')
+
+    # 日付表示（event_dateを優先）
+    if item['display_date']:
+        parts.append(f'<div class="card-caption">🗓️ {item["date_prefix"]}: {item["display_date"]}</div>')
+
+    # 価格表示
+    if item.get('price'):
+        parts.append(f'<div class="card-caption">💰 {item["price"]:,}円</div>')
+
+    parts.append(f'<a class="card-link" href="{html.escape(item["url"])}" target="_blank" rel="noopener noreferrer">🔗 詳細を見る</a>')
+    parts.append('</div>')
+    return "".join(parts)
+
+
+def normalize_item(item):
+    """
+    表示用にアイテムを整形（キャッシュ対象の取得処理内で1回だけ実行）
+
+    Args:
+        item: informationテーブルの行
+
+    Returns:
+        imagesをリストに変換し、thumbnail/display_date/date_prefix/card_htmlを付与したアイテム
+    """
+    images = item.get('images')
+    if isinstance(images, str):
+        try:
+            images = json.loads(images)
+        except ValueError:
+            images = []
+    item['images'] = images if isinstance(images, list) else []
+    item['thumbnail'] = thumbnail_url(item['images'][0]) if item['images'] else None
+
+    # 日付表示（event_dateを優先）
+    display_date = ""
+    date_prefix = ""
+
+    if item.get('event_date'):
+        display_date = format_event_date(item['event_date'])
+        if display_date:
+            if item['status'] == 'new':
+                date_prefix = "発売"
+            elif item['status'] == 'restock':
+                date_prefix = "再入荷"
+
+    if not display_date and item.get('published_at'):
+        try:
+            published_dt = datetime.fromisoformat(item['published_at'].replace('Z', '+00:00'))
+            display_date = published_dt.strftime('%Y年%m月%d日')
+            date_prefix = "収集"
+        except (ValueError, TypeError):
+            display_date = ""
+
+    item['display_date'] = display_date
+    item['date_prefix'] = date_prefix
+    item['card_html'] = build_card_html(item)
+    return item
+
+
+@st.cache_data(ttl=300, max_entries=32, show_spinner=False)
+def fetch_data(category, period, search, only_images, market_status, specific_date, page=0):
     """
     データベースから情報を取得
 
@@ -172,12 +342,13 @@ def fetch_data(category, period, search, only_images, market_status, specific_da
         only_images: 画像ありのみ
         market_status: 商品区分
         specific_date: 特定日付
+        page: ページ番号（0始まり）
 
     Returns:
         (総件数, データリスト)のタプル
     """
     def build_query():
-        query = supabase.table("information").select("*", count='exact')
+        query = supabase.table("information").select(INFORMATION_COLUMNS, count='exact')
 
         # ソースはちいかわマーケットのみ
         query = query.eq("source", "chiikawa_market")
@@ -192,15 +363,14 @@ def fetch_data(category, period, search, only_images, market_status, specific_da
         elif period != "すべて":
             days_map = {"24時間以内": 1, "3日以内": 3, "1週間以内": 7, "1ヶ月以内": 30}
             date_from = (datetime.now() - timedelta(days=days_map[period])).strftime('%Y-%m-%d')
-            # event_dateまたはpublished_atが期間内のものを取得
-            query = query.or_(f"event_date.gte.{date_from},published_at.gte.{date_from}")
+            # event_dateまたは収集日（published_date）が期間内のものを取得
+            query = query.or_(f"event_date.gte.{date_from},published_date.gte.{date_from}")
 
         if search:
             query = query.or_(f"title.ilike.%{search}%,content.ilike.%{search}%")
 
         if only_images:
-            query = query.not_.is_("images", "null")
-            query = query.not_.eq("images", '[]')
+            query = query.eq("has_images", True)
 
         if market_status != "すべて":
             status_value = "new" if market_status == "新商品" else "restock"
@@ -208,30 +378,79 @@ def fetch_data(category, period, search, only_images, market_status, specific_da
 
         return query
 
-    try:
-        query = build_query()
-        # event_dateを優先してソート、NULLは後ろに配置
-        result = query.order("event_date", desc=True, nullsfirst=False).order("published_at", desc=True).limit(200).execute()
+    # 例外はワーカースレッドから呼び出し元に伝播させ、エラー表示はメインスレッドで行う
+    query = build_query()
+    # event_dateを優先してソート、NULLは後ろに配置
+    offset = page * PAGE_SIZE
+    result = query.order("event_date", desc=True, nullsfirst=False).order("published_at", desc=True).range(offset, offset + PAGE_SIZE - 1).execute()
 
-        total_count = result.count if result.count is not None else 0
+    total_count = result.count if result.count is not None else 0
 
-        return total_count, result.data
+    return total_count, [normalize_item(item) for item in result.data]
 
-    except Exception as e:
-        st.error(f"データ取得エラー: {e}")
-        return 0, []
 
-
-# データ取得実行
-total_count, info_list = fetch_data(
+filters = (
     category,
     period,
-    search_text,
+    search_text.strip(),
     only_with_images,
     market_status,
     specific_date if use_specific_date else None
 )
 
+# フィルターが変わったら1ページ目に戻す
+if st.session_state.get("filters") != filters:
+    st.session_state.filters = filters
+    st.session_state.page = 0
+
+# データ取得実行（再入荷情報と商品一覧のDB往復を並列化）
+script_ctx = get_script_run_ctx()
+with ThreadPoolExecutor(max_workers=2) as executor:
+    restocks_future = executor.submit(run_with_script_ctx, script_ctx, fetch_recent_restocks, 7)
+    data_future = executor.submit(run_with_script_ctx, script_ctx, fetch_data, *filters, page=st.session_state.page)
+    with st.spinner("読み込み中..."):
+        # ワーカーで発生した例外は.result()で再送出されるので、ここでエラーを表示する
+        try:
+            recent_restocks = restocks_future.result()
+        except Exception as e:
+            recent_restocks = []
+            restocks_error = e
+        else:
+            restocks_error = None
+
+        try:
+            total_count, info_list = data_future.result()
+        except Exception as e:
+            total_count, info_list = 0, []
+            data_error = e
+        else:
+            data_error = None
+
+if restocks_error:
+    st.error(f"再入荷情報取得エラー: {restocks_error}")
+if data_error:
+    st.error(f"データ取得エラー: {data_error}")
+total_pages = max(1, -(-total_count // PAGE_SIZE))
+
+# 期間フィルターの経過や行の削除で件数が減り、現在のページが範囲外になった場合は最終ページに戻して再取得
+if not data_error and st.session_state.page >= total_pages:
+    st.session_state.page = total_pages - 1
+    st.rerun()
+
+# 再入荷情報を表示
+if recent_restocks:
+    st.info(f"🔔 **最近7日間の再入荷: {len(recent_restocks)}件**")
+    with st.expander("📦 再入荷商品を見る", expanded=False):
+        for restock in recent_restocks:
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.markdown(f"**{restock['product_title']}**")
+                date_info = f"{restock.get('previous_event_date', '不明')} → **{restock['new_event_date']}**"
+                st.caption(f"📅 {date_info}")
+            with col2:
+                st.link_button("詳細", restock['product_url'], use_container_width=True)
+        st.divider()
+
 # 統計表示
 st.subheader(f"📊 {total_count}件の商品が見つかりました")
 st.divider()
@@ -240,61 +459,22 @@ st.divider()
 if not info_list:
     st.info("📭 該当する情報がありません")
 else:
-    st.subheader(f"🎁 最新グッズ情報 ({len(info_list)}件)")
-
-    # 3アイテムごとに新しい行を作成
-    for i in range(0, len(info_list), 3):
-        cols = st.columns(3)
-        row_items = info_list[i:i+3]
-
-        for j, item in enumerate(row_items):
-            with cols[j]:
-                with st.container(border=True):
-                    # 画像表示
-                    if item.get('images'):
-                        try:
-                            images = item['images'] if isinstance(item['images'], list) else json.loads(item['images'])
-                            if images:
-                                st.image(images[0], use_column_width=True)
-                        except:
-                            pass
-
-                    # タイトルとステータスバッジ
-                    title_html = f"**{item['title']}**"
-                    if item.get('status'):
-                        status_text = "新商品" if item['status'] == 'new' else "再入荷"
-                        status_class = "status-new" if item['status'] == 'new' else "status-restock"
-                        title_html += f' <span class="status-badge {status_class}">{status_text}</span>'
-                    st.markdown(title_html, unsafe_allow_html=True)
-
-                    # 日付表示（event_dateを優先）
-                    display_date = ""
-                    date_prefix = ""
-
-                    if item.get('event_date'):
-                        try:
-                            date_obj = datetime.strptime(item['event_date'], '%Y-%m-%d')
-                            display_date = date_obj.strftime('%m月%d日')
-                            if item['status'] == 'new':
-                                date_prefix = "発売"
-                            elif item['status'] == 'restock':
-                                date_prefix = "再入荷"
-                        except (ValueError, TypeError):
-                            display_date = ""
-
-                    if not display_date and item.get('published_at'):
-                        try:
-                            published_dt = datetime.fromisoformat(item['published_at'].replace('Z', '+00:00'))
-                            display_date = published_dt.strftime('%Y年%m月%d日')
-                            date_prefix = "収集"
-                        except (ValueError, TypeError):
-                            display_date = ""
-
-                    if display_date:
-                        st.caption(f"🗓️ {date_prefix}: {display_date}")
-
-                    # 価格表示
-                    if item.get('price'):
-                        st.caption(f"💰 {item['price']:,}円")
-
-                    st.link_button("🔗 詳細を見る", item['url'], use_container_width=True)
+    st.subheader(f"🎁 最新グッズ情報 ({st.session_state.page + 1} / {total_pages}ページ)")
+
+    # カードグリッドを1つのHTMLブロックとして描画
+    grid_html = "".join(item['card_html'] for item in info_list)
+    st.markdown(f'<div class="card-grid">{grid_html}</div>', unsafe_allow_html=True)
+
+# ページ送り（取得エラーで一覧が空でも2ページ目以降なら前のページに戻れるようにする）
+if info_list or st.session_state.page > 0:
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("◀ 前へ", disabled=st.session_state.page == 0, use_container_width=True):
+            st.session_state.page -= 1
+            st.rerun()
+    with col_page:
+        st.caption(f"{st.session_state.page + 1} / {total_pages}ページ")
+    with col_next:
+        if st.button("次へ ▶", disabled=st.session_state.page + 1 >= total_pages, use_container_width=True):
+            st.session_state.page += 1
+            st.rerun()
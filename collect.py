@@ -4,18 +4,22 @@
 """
 import os
 import sys
-import time
 import hashlib
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterator, Optional
+from zoneinfo import ZoneInfo
 import re
-import pytz
 
 try:
     import requests
-    from bs4 import BeautifulSoup
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    from bs4 import BeautifulSoup, SoupStrainer
+    import soupsieve
     from supabase import create_client, Client
-    from notifier import DiscordNotifier
+    from notifier import DiscordNotifier, group_restock_items
 except ImportError as e:
     print(f"必要なライブラリがインストールされていません: {e}")
     sys.exit(1)
@@ -34,72 +38,181 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 # 定数
 BASE_URL = "https://chiikawamarket.jp"
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-TOKYO_TZ = pytz.timezone('Asia/Tokyo')
+TOKYO_TZ = ZoneInfo('Asia/Tokyo')
+REQUEST_TIMEOUT = 20
+MAX_CONCURRENT_REQUESTS = 4  # 同時リクエスト数の上限（レート制限対策）
+MAX_PAGE_BYTES = 2 * 1024 * 1024  # 1ページあたりの取得サイズ上限
+IN_FILTER_CHUNK_SIZE = 100  # in_()フィルター1回あたりの件数（URL長の上限対策）
+
+# 正規表現（ループ内で使うためモジュール読み込み時にコンパイル）
+DATE_RE = re.compile(r'(\d{1,2})月(\d{1,2})日')  # 例: "2月6日発売商品"
+URL_DATE_RE = re.compile(r'/collections/(?:re)?(\d{8})')  # 例: /collections/20260206
+SRCSET_SPLIT_RE = re.compile(r'\s*,\s*')
+PRICE_RE = re.compile(r'(\d[\d,.]*)')
+
+# 商品カード内の要素検索用（find()で使用、class属性のいずれかの値に一致）
+CARD_TITLE_CLASS_RE = re.compile(r'(?:^|\s)(?:card__heading|card-information__text)(?:\s|$)')
+CARD_MEDIA_CLASS_RE = re.compile(r'(?:^|\s)(?:card__media|media)(?:\s|$)')
+PRODUCT_HREF_RE = re.compile(r'/products/')
+
+# 商品カード一覧のCSSセレクタ（事前にコンパイル）
+GRID_ITEM_SELECTOR = soupsieve.compile('.product-grid .grid__item')
+CARD_WRAPPER_SELECTOR = soupsieve.compile('.card-wrapper')
+
+# トップページからはコレクションへのリンクのみを解析対象にする
+COLLECTION_LINK_STRAINER = SoupStrainer('a', href=re.compile(r'/collections/'))
+
+# コレクションページからは商品グリッド（またはカード）のみを解析対象にする
+PRODUCT_GRID_STRAINER = SoupStrainer(class_=re.compile(r'(?:^|\s)(?:product-grid|card-wrapper)(?:\s|$)'))
+
+# HTTPセッション（同一ホストへの接続を使い回す）
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': USER_AGENT})
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
 
 
 def generate_source_id(text: str) -> str:
-    """文字列からユニークIDを生成"""
-    return hashlib.md5(text.encode()).hexdigest()
+    """
+    文字列からユニークIDを生成
+
+    既存行の重複判定キーとして保存済みのため、ハッシュ方式は変更しない
+    """
+    return hashlib.md5(text.encode(), usedforsecurity=False).hexdigest()
 
 
-def check_restock(item: Dict) -> None:
+def chunked(values: List, size: int) -> Iterator[List]:
     """
-    再入荷をチェックして履歴に記録
+    リストを指定件数ごとに分割
 
     Args:
-        item: チェックする商品アイテム
+        values: 分割するリスト
+        size: 1チャンクあたりの件数
+
+    Returns:
+        分割したリストのイテレータ
     """
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def normalize_url(url: str) -> str:
+    """
+    URLを絶対URLに変換し、クエリ文字列を除去
+
+    Args:
+        url: 変換するURL（相対URL、//始まりのURLにも対応）
+
+    Returns:
+        正規化したURL
+    """
+    if url.startswith('//'):
+        url = f"https:{url}"
+    elif not url.startswith(('http://', 'https://')):
+        url = f"{BASE_URL}{url}"
+    return url.partition('?')[0]
+
+
+def fetch_page(url: str) -> bytes:
+    """
+    ページを取得してレスポンス本文を返す
+
+    Args:
+        url: 取得するURL
+
+    Returns:
+        レスポンス本文（バイト列、MAX_PAGE_BYTESで打ち切り）
+    """
+    with SESSION.get(url, timeout=REQUEST_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        content = bytearray()
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            content.extend(chunk)
+            if len(content) >= MAX_PAGE_BYTES:
+                print(f"  ⚠️ ページサイズが上限を超えたため途中まで取得: {url}")
+                break
+        return bytes(content)
+
+
+def check_restocks(items: List[Dict]) -> None:
+    """
+    再入荷をチェックして履歴に記録（問い合わせ・書き込みはまとめて実行）
+
+    Args:
+        items: チェックする商品アイテムのリスト（URLの重複除去済み）
+    """
+    # status='restock'でevent_dateがあるものだけが対象
+    restock_items = [item for item in items if item.get('status') == 'restock' and item.get('event_date')]
+    if not restock_items:
+        return
+
     try:
-        # status='restock'でない場合は何もしない
-        if item.get('status') != 'restock':
-            return
-
-        # 同じURLの既存商品を検索
-        existing = supabase.table("information").select("*").eq("url", item['url']).execute()
-
-        # 再入荷履歴データを準備
-        previous_event_date = None
-        if existing.data:
-            existing_item = existing.data[0]
-            previous_event_date = existing_item.get('event_date')
-
-        new_event_date = item.get('event_date')
-
-        # 同じURLと同じevent_dateの再入荷履歴があるかチェック（通知済みも含めて重複防止）
-        existing_restock = supabase.table("restock_history")\
-            .select("*")\
-            .eq("product_url", item['url'])\
-            .eq("new_event_date", new_event_date)\
-            .execute()
+        # 同じURLと同じevent_dateの再入荷履歴を一括取得（通知済みも含めて重複防止）
+        recorded = set()
+        for urls in chunked([item['url'] for item in restock_items], IN_FILTER_CHUNK_SIZE):
+            result = supabase.table("restock_history")\
+                .select("product_url,new_event_date")\
+                .in_("product_url", urls)\
+                .execute()
+            recorded.update((row['product_url'], row['new_event_date']) for row in result.data)
+
+        # 未記録の再入荷について、同じURLの既存商品を一括取得（URLごとに最初の1件を使う）
+        pending_urls = [item['url'] for item in restock_items if (item['url'], item['event_date']) not in recorded]
+        existing_by_url = {}
+        for urls in chunked(pending_urls, IN_FILTER_CHUNK_SIZE):
+            result = supabase.table("information")\
+                .select("id,url,event_date")\
+                .in_("url", urls)\
+                .execute()
+            for row in result.data:
+                existing_by_url.setdefault(row['url'], row)
 
-        if existing_restock.data:
-            # 既に同じ日付の再入荷履歴がある場合はスキップ（重複通知防止）
-            return
+        detected_at = datetime.now(TOKYO_TZ).isoformat()
+        history_rows = []
+        status_updates = defaultdict(list)  # new_event_date -> 更新するinformationのid
 
-        # 再入荷履歴に記録（初回収集でも既存商品があっても記録する）
-        is_new = not existing.data
-        print(f"  🔔 再入荷検出: {item['title'][:30]}... (初回収集: {is_new})")
+        for item in restock_items:
+            new_event_date = item['event_date']
+            if (item['url'], new_event_date) in recorded:
+                # 既に同じ日付の再入荷履歴がある場合はスキップ（重複通知防止）
+                continue
+
+            existing = existing_by_url.get(item['url'])
+
+            # 再入荷履歴に記録（初回収集でも既存商品があっても記録する）
+            is_new = existing is None
+            print(f"  🔔 再入荷検出: {item['title'][:30]}... (初回収集: {is_new})")
+
+            history_rows.append({
+                "product_url": item['url'],
+                "product_title": item['title'],
+                "previous_event_date": existing.get('event_date') if existing else None,
+                "new_event_date": new_event_date,
+                "detected_at": detected_at
+            })
 
-        restock_data = {
-            "product_url": item['url'],
-            "product_title": item['title'],
-            "previous_event_date": previous_event_date,
-            "new_event_date": new_event_date,
-            "detected_at": datetime.now(TOKYO_TZ).isoformat()
-        }
+            # 既存商品はstatusとevent_dateをrestockに更新
+            if existing:
+                status_updates[new_event_date].append(existing['id'])
 
-        supabase.table("restock_history").insert(restock_data).execute()
+        if history_rows:
+            supabase.table("restock_history").insert(history_rows).execute()
 
-        # 既存商品のstatusとevent_dateをrestockに更新
-        if existing.data:
+        # 既存商品の更新は同じevent_dateごとにまとめて実行
+        for new_event_date, ids in status_updates.items():
             supabase.table("information")\
                 .update({"status": "restock", "event_date": new_event_date})\
-                .eq("id", existing.data[0]['id'])\
+                .in_("id", ids)\
                 .execute()
-            print(f"  ✅ ステータス更新: {existing.data[0]['id']}")
+            print(f"  ✅ ステータス更新: {len(ids)}件 (再入荷日: {new_event_date})")
 
     except Exception as e:
-        print(f"  ⚠️ 再入荷チェックエラー: {item.get('title', '不明なアイテム')} - {e}")
+        print(f"  ⚠️ 再入荷チェックエラー: {e}")
 
 
 def save_to_db(items: List[Dict], source: str) -> int:
@@ -113,50 +226,52 @@ def save_to_db(items: List[Dict], source: str) -> int:
     Returns:
         保存件数
     """
-    saved_count = 0
-    processed_urls = set()  # 処理済みURLを記録
-
-    # 新しいアイテムが先に来るように逆順で処理
+    # URLの重複を除去（複数の再入荷ページから同じ商品が収集される場合がある）
+    # 新しいアイテムが先に来るように逆順で処理し、最初に出現したものを残す
+    unique_items = {}
     for item in reversed(items):
-        try:
-            # URLの重複チェック（複数の再入荷ページから同じ商品が収集される場合がある）
-            item_url = item['url']
-            if item_url in processed_urls:
-                continue
-            processed_urls.add(item_url)
+        unique_items.setdefault(item['url'], item)
+
+    # 再入荷チェック（保存前に実行）
+    check_restocks(list(unique_items.values()))
+
+    # 投稿日時が無いアイテム用のフォールバックはループ外で1回だけ計算
+    now_iso = datetime.now(TOKYO_TZ).isoformat()
+
+    rows = []
+    for item in unique_items.values():
+        rows.append({
+            "source": source,
+            "source_id": item['source_id'],
+            "title": item['title'],
+            "content": item.get('content', item['title']),
+            "url": item['url'],
+            "images": item.get('images', []),
+            "price": item.get('price'),
+            "category": "グッズ",
+            "published_at": item.get('published_at', now_iso),
+            "status": item.get('status', 'new'),
+            "event_date": item.get('event_date')
+        })
+
+    if not rows:
+        return 0
 
-            # 再入荷チェック（保存前に実行）
-            check_restock(item)
-
-            # 重複チェック
-            existing = supabase.table("information").select("id").eq("source_id", item['source_id']).execute()
-
-            if not existing.data:
-                data = {
-                    "source": source,
-                    "source_id": item['source_id'],
-                    "title": item['title'],
-                    "content": item.get('content', item['title']),
-                    "url": item['url'],
-                    "images": item.get('images', []),
-                    "price": item.get('price'),
-                    "category": "グッズ",
-                    "published_at": item.get('published_at', datetime.now(TOKYO_TZ).isoformat()),
-                    "status": item.get('status', 'new'),
-                    "event_date": item.get('event_date')
-                }
-
-                supabase.table("information").insert(data).execute()
-                saved_count += 1
-                img_count = len(item.get('images', []))
-                print(f"  ✅ 保存: {item['title'][:30]}... (画像{img_count}枚)")
-
-        except Exception as e:
-            print(f"  ⚠️ 保存エラー: {item.get('title', '不明なアイテム')} - {e}")
+    try:
+        # source_idが既存の行はスキップして一括保存（ON CONFLICT DO NOTHING）
+        result = supabase.table("information")\
+            .upsert(rows, on_conflict="source_id", ignore_duplicates=True)\
+            .execute()
+    except Exception as e:
+        print(f"  ⚠️ 保存エラー: {e}")
+        return 0
 
-        time.sleep(0.1)
+    # 戻り値には新規に保存された行のみが含まれる
+    for saved in result.data:
+        img_count = len(saved.get('images') or [])
+        print(f"  ✅ 保存: {saved['title'][:30]}... (画像{img_count}枚)")
 
-    return saved_count
+    return len(result.data)
 
 
 def extract_event_date(date_text: Optional[str], url: str) -> Optional[str]:
@@ -172,7 +287,7 @@ def extract_event_date(date_text: Optional[str], url: str) -> Optional[str]:
     """
     # 1. date_textから日付を抽出
     if date_text:
-        match = re.search(r'(\d{1,2})月(\d{1,2})日', date_text)
+        match = DATE_RE.search(date_text)
         if match:
             month, day = int(match.group(1)), int(match.group(2))
             now = datetime.now(TOKYO_TZ)
@@ -185,7 +300,7 @@ def extract_event_date(date_text: Optional[str], url: str) -> Optional[str]:
                 pass
 
     # 2. URLから日付を抽出
-    url_date_match = re.search(r'/collections/(?:re)?(\d{8})', url)
+    url_date_match = URL_DATE_RE.search(url)
     if url_date_match:
         date_str = url_date_match.group(1)
         try:
@@ -211,46 +326,39 @@ def get_latest_market_urls() -> List[Dict[str, str]]:
     seen_urls = set()
 
     try:
-        headers = {'User-Agent': USER_AGENT}
-        response = requests.get(BASE_URL, headers=headers, timeout=20)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
+        # コレクションへのリンク以外はツリーを構築しない
+        soup = BeautifulSoup(fetch_page(BASE_URL), 'lxml', parse_only=COLLECTION_LINK_STRAINER)
 
         # すべてのリンクを探索
-        for link in soup.select('a[href*="/collections/"]'):
-            href = link.get('href')
+        for link in soup.find_all('a'):
             text = link.get_text(strip=True)
 
-            if not href:
+            # 対象外のリンクは文字列判定だけで先に除外
+            if '発売商品' in text:
+                # 新商品リンク（例: "2月6日発売商品"）
+                status = 'new'
+            elif '再入荷商品' in text and '再入荷商品一覧' not in text:
+                # 再入荷リンク（例: "2月5日再入荷商品"）
+                status = 'restock'
+            else:
+                continue
+
+            if not DATE_RE.search(text):
                 continue
 
+            href = link['href']
             full_url = f"{BASE_URL}{href}" if not href.startswith('http') else href
 
             # 重複チェック
             if full_url in seen_urls:
                 continue
+            seen_urls.add(full_url)
 
-            # 新商品リンク（例: "2月6日発売商品"）
-            if '発売商品' in text:
-                date_match = re.search(r'(\d{1,2})月(\d{1,2})日', text)
-                if date_match:
-                    collections.append({
-                        'url': full_url,
-                        'status': 'new',
-                        'date_text': text
-                    })
-                    seen_urls.add(full_url)
-
-            # 再入荷リンク（例: "2月5日再入荷商品"）
-            elif '再入荷商品' in text and '再入荷商品一覧' not in text:
-                date_match = re.search(r'(\d{1,2})月(\d{1,2})日', text)
-                if date_match:
-                    collections.append({
-                        'url': full_url,
-                        'status': 'restock',
-                        'date_text': text
-                    })
-                    seen_urls.add(full_url)
+            collections.append({
+                'url': full_url,
+                'status': status,
+                'date_text': text
+            })
 
         if collections:
             print(f"  👍 取得成功: {len(collections)}個の日付別ページを発見")
@@ -266,7 +374,12 @@ def get_latest_market_urls() -> List[Dict[str, str]]:
         return []
 
 
-def collect_chiikawa_market(url: str, status: str, date_text: Optional[str] = None) -> List[Dict]:
+def collect_chiikawa_market(
+    url: str,
+    status: str,
+    date_text: Optional[str] = None,
+    page: Optional[Future] = None
+) -> List[Dict]:
     """
     ちいかわマーケットから商品情報を収集
 
@@ -274,6 +387,7 @@ def collect_chiikawa_market(url: str, status: str, date_text: Optional[str] = No
         url: 収集対象のURL
         status: 商品区分（'new' or 'restock'）
         date_text: 日付テキスト（オプション）
+        page: 取得を先行開始したページのFuture（未指定の場合はここで取得）
 
     Returns:
         商品情報のリスト
@@ -285,54 +399,57 @@ def collect_chiikawa_market(url: str, status: str, date_text: Optional[str] = No
     print(f"  ({status}) 収集開始: {url}")
 
     try:
-        headers = {'User-Agent': USER_AGENT}
-        response = requests.get(url, headers=headers, timeout=20)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
+        content = page.result() if page else fetch_page(url)
+        soup = BeautifulSoup(content, 'lxml', parse_only=PRODUCT_GRID_STRAINER)
 
         # イベント日の抽出
         event_date_str = extract_event_date(date_text, url)
 
+        # 収集日時はページ単位で1回だけ計算
+        published_at = datetime.now(TOKYO_TZ).isoformat()
+
         results = []
-        items = soup.select('.card-wrapper, .product-grid .grid__item')
+        # 商品カード（.grid__item内に.card-wrapperが入れ子になるため、両方を同時に選択しない）
+        items = GRID_ITEM_SELECTOR.select(soup) or CARD_WRAPPER_SELECTOR.select(soup)
 
         for item in items:
             # タイトル取得
-            title_elem = item.select_one('.card__heading, .card-information__text')
+            title_elem = item.find(class_=CARD_TITLE_CLASS_RE)
             if not title_elem:
                 continue
             title = title_elem.get_text(strip=True)
 
             # URL取得
-            link_elem = item.select_one('a[href*="/products/"]')
+            link_elem = item.find('a', href=PRODUCT_HREF_RE)
             if not link_elem:
                 continue
-            product_url = link_elem.get('href')
-            if not product_url.startswith('http'):
-                product_url = f"{BASE_URL}{product_url.split('?')[0]}"
+            product_url = normalize_url(link_elem.get('href'))
 
             # ユニークID生成
             source_id = generate_source_id(f"{product_url}_{title}")
 
             # 画像取得
             images = []
-            img_tag = item.select_one('.card__media img, .media img')
+            media_elem = item.find(class_=CARD_MEDIA_CLASS_RE)
+            img_tag = media_elem.find('img') if media_elem else None
             if img_tag:
-                img_url = img_tag.get('src') or img_tag.get('data-src')
-                if not img_url and img_tag.get('srcset'):
-                    img_url = re.split(r'\s*,\s*', img_tag.get('srcset'))[0].split(' ')[0]
+                img_attrs = img_tag.attrs
+                img_url = img_attrs.get('src') or img_attrs.get('data-src')
+                if not img_url and img_attrs.get('srcset'):
+                    img_url = SRCSET_SPLIT_RE.split(img_attrs['srcset'], maxsplit=1)[0].partition(' ')[0]
 
                 if img_url:
-                    if img_url.startswith('//'):
-                        img_url = f"https:{img_url}"
-                    images.append(img_url.split('?')[0])
+                    images.append(normalize_url(img_url))
 
             # 価格取得
             price = None
-            price_elem = item.select_one('.price__regular .price-item, .price-item--regular')
+            regular_elem = item.find(class_='price__regular')
+            price_elem = regular_elem.find(class_='price-item') if regular_elem else None
+            if not price_elem:
+                price_elem = item.find(class_='price-item--regular')
             if price_elem:
                 price_text = price_elem.get_text(strip=True)
-                match = re.search(r'(\d[\d,.]*)', price_text)
+                match = PRICE_RE.search(price_text)
                 if match:
                     try:
                         price = int(float(match.group(1).replace(',', '')))
@@ -345,7 +462,7 @@ def collect_chiikawa_market(url: str, status: str, date_text: Optional[str] = No
                 'url': product_url,
                 'images': images,
                 'price': price,
-                'published_at': datetime.now(TOKYO_TZ).isoformat(),
+                'published_at': published_at,
                 'status': status,
                 'event_date': event_date_str
             })
@@ -375,16 +492,19 @@ def main():
 
     # 各コレクションから情報を収集
     all_items = []
-    for collection in collections:
-        status_label = "新商品" if collection['status'] == 'new' else "再入荷"
-        print(f"\n--- chiikawa_market ({status_label}: {collection['date_text']}) 収集 ---")
-        items = collect_chiikawa_market(
-            collection['url'],
-            collection['status'],
-            collection['date_text']
-        )
-        all_items.extend(items)
-        time.sleep(1)
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        # ページの取得は並列で先に開始し、解析・ログ出力はページ順に行う
+        pages = [executor.submit(fetch_page, collection['url']) for collection in collections]
+        for collection, page in zip(collections, pages):
+            status_label = "新商品" if collection['status'] == 'new' else "再入荷"
+            print(f"\n--- chiikawa_market ({status_label}: {collection['date_text']}) 収集 ---")
+            items = collect_chiikawa_market(
+                collection['url'],
+                collection['status'],
+                collection['date_text'],
+                page
+            )
+            all_items.extend(items)
 
     # データベースに保存
     if all_items:
@@ -395,6 +515,11 @@ def main():
     else:
         print("  ⚠️ chiikawa_marketからの新規情報はありませんでした。")
 
+    # サマリー通知（オプション）は再入荷通知の最初のメッセージに同梱する
+    send_summary = notifier.enabled and os.getenv("DISCORD_SEND_SUMMARY", "false").lower() == "true"
+    summary_sent = False
+    restock_count = 0  # サマリーに載せる再入荷件数（重複除去後）
+
     # 未通知の再入荷情報を取得して通知
     print("\n--- 再入荷通知 ---")
     try:
@@ -402,14 +527,28 @@ def main():
 
         if unnotified.data:
             print(f"  📬 未通知の再入荷: {len(unnotified.data)}件")
+            restock_count = len(group_restock_items(unnotified.data))
 
-            # Discord通知送信
-            if notifier.send_restock_notification(unnotified.data):
-                print(f"  ✅ Discord通知送信成功")
+            # Discord通知送信（途中で失敗した場合は送信できた分だけが返る）
+            if send_summary:
+                delivered = notifier.send_batch(unnotified.data, total_saved)
+                # サマリーは最初のメッセージに同梱されるため、1件でも送れていれば送信済み
+                summary_sent = bool(delivered)
+            else:
+                delivered = notifier.send_restock_notification(unnotified.data)
 
-                # 通知済みフラグを更新
-                for item in unnotified.data:
-                    supabase.table("restock_history").update({"notified": True}).eq("id", item['id']).execute()
+            if delivered:
+                if len(delivered) == len(unnotified.data):
+                    print(f"  ✅ Discord通知送信成功")
+                else:
+                    print(f"  ⚠️ Discord通知は一部のみ送信 ({len(delivered)}/{len(unnotified.data)}件、残りは次回再送)")
+
+                # 送信できた分だけ通知済みフラグを更新（まとめて実行）
+                for ids in chunked([item['id'] for item in delivered], IN_FILTER_CHUNK_SIZE):
+                    supabase.table("restock_history")\
+                        .update({"notified": True})\
+                        .in_("id", ids)\
+                        .execute()
                 print(f"  ✅ 通知フラグ更新完了")
             else:
                 if notifier.enabled:
@@ -422,13 +561,16 @@ def main():
     except Exception as e:
         print(f"  ⚠️ 再入荷通知処理エラー: {e}")
 
-    # サマリー通知（オプション）
-    if notifier.enabled and os.getenv("DISCORD_SEND_SUMMARY", "false").lower() == "true":
-        restock_count = len(unnotified.data) if unnotified.data else 0
+    # 再入荷が無かった（または取得・同梱送信に失敗した）場合はサマリーのみ送信
+    if send_summary and not summary_sent:
         notifier.send_summary(total_saved, restock_count)
 
+    notifier.close()
     print(f"\n✨ 完了！合計 {total_saved} 件の新規情報を保存しました")
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        SESSION.close()
@@ -0,0 +1,6 @@
+-- キーワード検索（title/contentのILIKE）高速化用インデックス（オプション）
+-- 日本語対応のPGroonga拡張が必要。create_table.sql の実行後に実行する
+-- PGroongaが使えない環境では実行しなくても検索は動作する（インデックスなしの検索になる）
+CREATE EXTENSION IF NOT EXISTS pgroonga;
+CREATE INDEX IF NOT EXISTS idx_title_pgroonga ON information USING pgroonga(title);
+CREATE INDEX IF NOT EXISTS idx_content_pgroonga ON information USING pgroonga(content);
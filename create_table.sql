@@ -20,4 +20,18 @@ CREATE INDEX IF NOT EXISTS idx_source ON information(source);
 CREATE INDEX IF NOT EXISTS idx_category ON information(category);
 CREATE INDEX IF NOT EXISTS idx_published_at ON information(published_at DESC);
 CREATE INDEX IF NOT EXISTS idx_created_at ON information(created_at DESC);
-CREATE INDEX IF NOT EXISTS idx_status ON information(status);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_status ON information(status);
+CREATE INDEX IF NOT EXISTS idx_source_published_at ON information(source, published_at DESC);
+CREATE INDEX IF NOT EXISTS idx_event_date_published_at ON information(event_date DESC NULLS LAST, published_at DESC);
+
+-- 画像ありフィルター用の生成カラム（既存テーブルにも追加される）
+ALTER TABLE information ADD COLUMN IF NOT EXISTS has_images BOOLEAN
+  GENERATED ALWAYS AS (images IS NOT NULL AND images <> '[]'::jsonb) STORED;
+
+-- 画像ありのみ表示時の一覧取得用（部分インデックス）
+CREATE INDEX IF NOT EXISTS idx_has_images_event_date ON information(event_date DESC NULLS LAST, published_at DESC) WHERE has_images;
+
+-- 期間フィルター用の収集日カラム（published_atはJSTの日時で保存されている）
+ALTER TABLE information ADD COLUMN IF NOT EXISTS published_date DATE
+  GENERATED ALWAYS AS (published_at::date) STORED;
+CREATE INDEX IF NOT EXISTS idx_published_date ON information USING brin(published_date);
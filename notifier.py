@@ -3,9 +3,95 @@
 Discord Webhookへの通知送信機能を提供
 """
 import os
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import List, Dict, Optional
 from datetime import datetime
+from urllib.parse import urlsplit
+
+# プロキシへの差し替え対象とするDiscordのWebhookホスト
+DISCORD_WEBHOOK_HOSTS = {"discord.com", "discordapp.com", "ptb.discord.com", "canary.discord.com"}
+MAX_EMBEDS_PER_MESSAGE = 10  # Discordの1メッセージあたりのEmbed上限
+REQUEST_TIMEOUT = (3.05, 10)  # (接続, 読み込み) 秒。Discordに繋がらない場合は早めに失敗させる
+RESTOCK_COLOR = 0xFF9800  # オレンジ色（再入荷）
+SUMMARY_COLOR = 0x4CAF50  # 緑色
+
+
+def build_restock_embed(item: Dict, fallback_timestamp: str) -> Dict:
+    """
+    再入荷アイテム1件分のEmbedを構築
+
+    Args:
+        item: 再入荷アイテム（restock_historyの行）
+        fallback_timestamp: detected_atが無い場合に使うタイムスタンプ
+
+    Returns:
+        Embedの辞書
+    """
+    fields = [{"name": "📅 再入荷日", "value": item.get('new_event_date', '不明'), "inline": True}]
+
+    # 以前の発売日がある場合
+    previous_event_date = item.get('previous_event_date')
+    if previous_event_date:
+        fields.append({"name": "📆 以前の発売日", "value": previous_event_date, "inline": True})
+
+    return {
+        "title": item['product_title'][:256],  # 最大256文字
+        "url": item['product_url'],
+        "color": RESTOCK_COLOR,
+        "fields": fields,
+        "timestamp": item.get('detected_at') or fallback_timestamp
+    }
+
+
+def group_restock_items(restock_items: List[Dict]) -> List[List[Dict]]:
+    """
+    同じ商品・同じ再入荷日の再入荷アイテムをまとめる
+
+    まとめた行も通知済みにできるよう、キーごとに元の行をすべて保持する。
+
+    Args:
+        restock_items: 再入荷アイテムのリスト
+
+    Returns:
+        (product_url, new_event_date)ごとの行リストのリスト（出現順）
+    """
+    groups = {}
+    for item in restock_items:
+        groups.setdefault((item['product_url'], item.get('new_event_date')), []).append(item)
+    return list(groups.values())
+
+
+def build_summary_embed(total_collected: int, total_restocks: int) -> Dict:
+    """
+    収集サマリーのEmbedを構築
+
+    Args:
+        total_collected: 新規収集件数
+        total_restocks: 再入荷検出件数
+
+    Returns:
+        Embedの辞書
+    """
+    return {
+        "title": "✅ ちいかわ情報収集完了",
+        "color": SUMMARY_COLOR,
+        "fields": [
+            {
+                "name": "📦 新規収集",
+                "value": f"{total_collected}件",
+                "inline": True
+            },
+            {
+                "name": "🔔 再入荷検出",
+                "value": f"{total_restocks}件",
+                "inline": True
+            }
+        ],
+        "timestamp": datetime.now().isoformat()
+    }
 
 
 class DiscordNotifier:
@@ -20,65 +106,106 @@ class DiscordNotifier:
         """
         self.webhook_url = webhook_url or os.getenv("DISCORD_WEBHOOK_URL")
         self.enabled = bool(self.webhook_url)
+        self.rate_limit_reset_at = 0.0  # レート制限が解除される時刻（time.monotonic()基準）
+
+        # Webhookプロキシが指定されている場合はホスト部分だけを差し替える（パスはそのまま）
+        proxy = os.getenv("DISCORD_WEBHOOK_PROXY")
+        if self.enabled and proxy:
+            parts = urlsplit(self.webhook_url)
+            if parts.scheme == "https" and parts.hostname in DISCORD_WEBHOOK_HOSTS:
+                query = f"?{parts.query}" if parts.query else ""
+                self.webhook_url = f"{proxy.rstrip('/')}{parts.path}{query}"
+            else:
+                print(f"  ⚠️ DISCORD_WEBHOOK_PROXYは設定されていますが、DiscordのWebhook URLではないため適用しません: {parts.hostname}")
+
+        # 同じWebhookへの送信はHTTPS接続を使い回す
+        self.session = requests.Session() if self.enabled else None
+        if self.session:
+            # 接続エラー・429（Retry-Afterに従う）・503は指数バックオフで再送する
+            # 読み込みタイムアウトや500/502/504はDiscord側で投稿済みの可能性があるため再送しない（重複通知防止）
+            retry = Retry(
+                total=5,
+                read=0,
+                backoff_factor=0.5,
+                status_forcelist=[429, 503],
+                allowed_methods=["POST"],
+                raise_on_status=False
+            )
+            self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=retry))
 
-    def send_restock_notification(self, restock_items: List[Dict]) -> bool:
+    def close(self) -> None:
+        """保持しているHTTP接続を閉じる"""
+        if self.session:
+            self.session.close()
+
+    def send_restock_notification(self, restock_items: List[Dict], summary_total_collected: Optional[int] = None) -> List[Dict]:
         """
         再入荷情報をDiscordに通知
 
+        送信に失敗したメッセージがあればそこで中断し、以降のメッセージは送らない。
+
         Args:
             restock_items: 再入荷アイテムのリスト
+            summary_total_collected: 新規収集件数（指定した場合は最初のメッセージの先頭にサマリーを同梱）
 
         Returns:
-            通知成功: True、失敗: False
+            通知できたアイテムのリスト（重複としてまとめたアイテムも含む）
         """
         if not self.enabled or not restock_items:
-            return False
+            return []
+
+        # 同じ商品・同じ再入荷日の重複は1件にまとめる（Webhookのレート制限を無駄にしない）
+        grouped_items = group_restock_items(restock_items)
+        restock_items = [group[0] for group in grouped_items]
+
+        # detected_atが無い場合のタイムスタンプはループ外で1回だけ計算
+        fallback_timestamp = datetime.now().isoformat()
 
-        # Embedsを構築（最大10件まで）
-        embeds = []
-        for item in restock_items[:10]:
-            embed = {
-                "title": item['product_title'][:256],  # 最大256文字
-                "url": item['product_url'],
-                "color": 0xFF9800,  # オレンジ色（再入荷）
-                "fields": [
-                    {
-                        "name": "📅 再入荷日",
-                        "value": item.get('new_event_date', '不明'),
-                        "inline": True
-                    }
-                ],
-                "timestamp": item.get('detected_at', datetime.now().isoformat())
+        # 全件を送るため10件ずつのメッセージに分割し、Embedsは送信するメッセージ分だけ構築する
+        # （ヘッダーとサマリーは最初のメッセージにだけ付ける）
+        # サマリーの再入荷件数はヘッダーと揃えて重複除去後の件数を使う
+        leading_embeds = []
+        if summary_total_collected is not None:
+            leading_embeds.append(build_summary_embed(summary_total_collected, len(restock_items)))
+        delivered = []
+        start = 0
+        while start < len(restock_items):
+            end = start + MAX_EMBEDS_PER_MESSAGE - len(leading_embeds)
+            payload = {
+                "embeds": leading_embeds + [
+                    build_restock_embed(item, fallback_timestamp) for item in restock_items[start:end]
+                ]
             }
+            if start == 0:
+                payload["content"] = f"🔔 **ちいかわマーケット再入荷情報** ({len(restock_items)}件)"
+            if not self.post(payload):
+                # 残りは未通知のまま次回の実行で再送する
+                break
+            for group in grouped_items[start:end]:
+                delivered.extend(group)
+            leading_embeds = []
+            start = end
 
-            # 以前の発売日がある場合
-            if item.get('previous_event_date'):
-                embed["fields"].append({
-                    "name": "📆 以前の発売日",
-                    "value": item['previous_event_date'],
-                    "inline": True
-                })
+        return delivered
 
-            embeds.append(embed)
+    def send_batch(self, restock_items: List[Dict], total_collected: int) -> List[Dict]:
+        """
+        再入荷情報と収集サマリーをまとめて通知（サマリーは最初のメッセージに同梱）
 
-        # メッセージペイロード構築
-        payload = {
-            "content": f"🔔 **ちいかわマーケット再入荷情報** ({len(restock_items)}件)",
-            "embeds": embeds
-        }
+        サマリーの再入荷検出件数は重複除去後の件数になる。
 
-        # Discord Webhookに送信
-        try:
-            response = requests.post(
-                self.webhook_url,
-                json=payload,
-                timeout=10
-            )
-            response.raise_for_status()
-            return True
-        except Exception as e:
-            print(f"  ⚠️ Discord通知エラー: {e}")
-            return False
+        Args:
+            restock_items: 再入荷アイテムのリスト
+            total_collected: 新規収集件数
+
+        Returns:
+            通知できた再入荷アイテムのリスト
+        """
+        if not restock_items:
+            self.send_summary(total_collected, 0)
+            return []
+
+        return self.send_restock_notification(restock_items, summary_total_collected=total_collected)
 
     def send_summary(self, total_collected: int, total_restocks: int) -> bool:
         """
@@ -94,34 +221,38 @@ class DiscordNotifier:
         if not self.enabled:
             return False
 
-        embed = {
-            "title": "✅ ちいかわ情報収集完了",
-            "color": 0x4CAF50,  # 緑色
-            "fields": [
-                {
-                    "name": "📦 新規収集",
-                    "value": f"{total_collected}件",
-                    "inline": True
-                },
-                {
-                    "name": "🔔 再入荷検出",
-                    "value": f"{total_restocks}件",
-                    "inline": True
-                }
-            ],
-            "timestamp": datetime.now().isoformat()
-        }
-
-        payload = {"embeds": [embed]}
+        payload = {"embeds": [build_summary_embed(total_collected, total_restocks)]}
+
+        return self.post(payload)
+
+    def post(self, payload: Dict) -> bool:
+        """
+        Webhookにメッセージを1件送信
+
+        Args:
+            payload: 送信するメッセージペイロード
+
+        Returns:
+            送信成功: True、失敗: False
+        """
+        # 前回の送信でレート制限の残りが無くなっていれば、解除まで待ってから送信する
+        # （最後のメッセージの後には待たない）
+        wait = self.rate_limit_reset_at - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
 
         try:
-            response = requests.post(
+            response = self.session.post(
                 self.webhook_url,
                 json=payload,
-                timeout=10
+                timeout=REQUEST_TIMEOUT
             )
             response.raise_for_status()
-            return True
         except Exception as e:
             print(f"  ⚠️ Discord通知エラー: {e}")
             return False
+
+        # レート制限の残りが無い場合は解除時刻を記録し、次の送信時に待つ
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            self.rate_limit_reset_at = time.monotonic() + float(response.headers.get("X-RateLimit-Reset-After", "1"))
+        return True